@@ -1,10 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import gspread
 import plotly.express as px
+import plotly.graph_objects as go
 import datetime
+import hashlib
+import hmac
 import time
+from google.auth.exceptions import GoogleAuthError
 from google.oauth2.service_account import Credentials
+from gspread.exceptions import GSpreadException
+from requests.exceptions import RequestException
 
 # --- CONFIGURATION (Must be first) ---
 st.set_page_config(
@@ -28,12 +35,21 @@ def get_client():
     )
     return gspread.authorize(creds)
 
+# open() searches Drive by title and fetches metadata; do it once per process
+@st.cache_resource
+def get_spreadsheet(sheet_name):
+    return get_client().open(sheet_name)
+
 # ==========================================
 # ⚙️ SHEET CONFIGURATION
 # To switch to TEST mode, change this to: 'M-ajira_Logs_Test'
 # ==========================================
 SHEET_NAME = 'M-ajira_Logs_Test' 
-ADMIN_PASSWORD = st.secrets["general"]["admin_password"]
+
+# Read the secret once per process and keep only its digest
+@st.cache_resource
+def get_admin_digest():
+    return hashlib.sha256(st.secrets["general"]["admin_password"].encode()).digest()
 
 # --- CUSTOM CSS (NUCLEAR STEALTH MODE) ---
 st.markdown("""
@@ -52,188 +68,465 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Columns the dashboard reads (Phone is kept for the raw call logs); the rest
+# of the sheet is dropped at parse time
+USED_COLUMNS = ('Timestamp', 'Source', 'Category', 'Disposition', 'Lead Status', 'Skill', 'County', 'Agent Name', 'Call Status', 'Specific Reason', 'Phone')
+
+# Backward compatibility: value used when an older sheet lacks the column
+COLUMN_DEFAULTS = {
+    'Call Status': 'Answered',
+    'Category': 'General Inquiry',
+    'Specific Reason': 'N/A',
+    'Lead Status': 'Inquiry Only' # Default for old rows
+}
+
+# Low-cardinality text columns, stored as pandas categoricals
+CATEGORY_COLUMNS = ('Disposition', 'Category', 'Specific Reason', 'Lead Status', 'Source', 'Skill', 'County', 'Call Status', 'Agent Name')
+
+# 'Interested' = Hot Lead
+# 'Registered' = Paid Activation (Satisfies Manager)
+INTERESTED_STATUSES = ['Interested', 'Registered', 'Registered (Paid Activation)']
+
+# Above this many Category/Reason pairs the breakdown is drawn as a treemap
+MAX_SUNBURST_LEAVES = 200
+
+# Fixed chart height in px; only the width follows the column
+CHART_HEIGHT = 450
+
+# Timestamp layout written by the UserScript
+TIMESTAMP_FORMAT = '%d/%m/%Y %H:%M:%S'
+
+# The National Reach pie shows this many counties plus an 'Other' slice
+MAX_COUNTY_SLICES = 15
+
 # --- DATA ENGINE ---
-def load_data():
+# The sheet is append-only, so parsed rows are kept in memory and mirrored to
+# parquet on /tmp. Each refresh only downloads the rows added since the last
+# fetch; a restarted process picks up from the parquet file instead of
+# re-reading the whole sheet. The last row seen is re-fetched with them, and
+# any mismatch (rows inserted or deleted higher up) falls back to a full read.
+# Per-version values load_data stores in df.attrs (and so in the snapshot)
+SNAPSHOT_ATTRS = {'schema', 'headers', 'n_rows', 'last_row', 'synced_at', 'top_source', 'top_skill', 'hour_hist'}
+# Bump whenever load_data adds or changes a derived column, so frames built
+# by older code (in memory or on disk) are re-read instead of reused
+SNAPSHOT_SCHEMA = 3
+
+# Full re-read at least this often, so edits to existing rows show up
+RESYNC_SECONDS = 600
+
+@st.cache_resource
+def get_row_cache(sheet_name):
+    cache = {'df': None, 'path': f"/tmp/{sheet_name}.parquet"}
     try:
-        gc = get_client()
-        sh = gc.open(SHEET_NAME).sheet1
-        rows = sh.get_all_values()
-        
+        df = pd.read_parquet(cache['path'], engine='pyarrow')
+        if SNAPSHOT_ATTRS <= df.attrs.keys() and df.attrs['schema'] == SNAPSHOT_SCHEMA:
+            cache['df'] = df
+    except (OSError, ValueError):
+        pass # No usable snapshot yet, the next fetch rebuilds it
+    return cache
+
+def clean_headers(row):
+    # Trailing blank header cells carry no column name
+    headers = [h.strip() for h in row]
+    while headers and not headers[-1]:
+        headers.pop()
+    return headers
+
+def fit_row(row, width):
+    # Pad/trim a ragged row (the API drops trailing empty cells)
+    return row[:width] + [''] * (width - len(row))
+
+def parse_rows(rows, headers):
+    # Fit every row to the header, then transpose once so the frame is built
+    # column by column
+    width = len(headers)
+    rows = [fit_row(r, width) for r in rows]
+    df = pd.DataFrame(dict(zip(headers, zip(*rows))))
+
+    # --- FIX 1: HANDLE MISSING COLUMNS ---
+    # One reindex keeps the used columns (in sheet order) and adds any missing
+    # ones, which fillna then sets to their defaults
+    if 'Category' not in df.columns and 'Disposition' in df.columns:
+        df['Category'] = df['Disposition']
+    keep = [c for c in df.columns if c in USED_COLUMNS]
+    keep += [c for c in COLUMN_DEFAULTS if c not in df.columns]
+    df = df.reindex(columns=keep).fillna(COLUMN_DEFAULTS)
+
+    # --- FIX 2: DATE PARSING ---
+    # Data arrives as DD/MM/YYYY HH:MM:SS (e.g. 20/12/2025 14:05:09); the
+    # explicit format keeps pandas on its vectorized parser. Anything else is
+    # re-parsed row by row with dayfirst=True.
+    # We NO LONGER add +11 hours because the UserScript sends EAT time directly.
+    raw_ts = df['Timestamp']
+    ts = pd.to_datetime(raw_ts, format=TIMESTAMP_FORMAT, errors='coerce')
+    unparsed = ts.isna() & raw_ts.ne('')
+    if unparsed.any():
+        ts[unparsed] = pd.to_datetime(raw_ts[unparsed], format='mixed', dayfirst=True, errors='coerce')
+    df['Timestamp'] = ts
+    df['Hour'] = df['Timestamp'].dt.hour
+
+    return df
+
+# Reruns within the TTL (widget clicks, the refresh loop) are served from RAM.
+# Errors propagate instead of being cached, so the next rerun retries.
+@st.cache_data(ttl=30, show_spinner=False)
+def load_data(sheet_name):
+    cache = get_row_cache(sheet_name)
+    sh = get_spreadsheet(sheet_name)
+    cached = cache['df']
+    if cached is not None and cached.attrs.get('schema') != SNAPSHOT_SCHEMA:
+        cached = None # Built by older code: re-read the whole sheet
+    elif cached is not None and time.time() - cached.attrs['synced_at'] > RESYNC_SECONDS:
+        cached = None # Periodic full read picks up edited rows
+
+    if cached is not None:
+        # Warm: the header row and everything from the last row we have seen
+        # down, in a single request (ranges without a sheet name hit the
+        # first tab)
+        headers = cached.attrs['headers']
+        n_rows = cached.attrs['n_rows']
+        synced_at = cached.attrs['synced_at']
+        last_col = gspread.utils.rowcol_to_a1(1, len(headers)).rstrip('0123456789')
+        head_range, tail_range = sh.values_batch_get(['1:1', f"A{n_rows}:{last_col}"])['valueRanges']
+        tail_rows = tail_range.get('values', [])
+        if clean_headers(head_range.get('values', [[]])[0]) != headers:
+            cached = None # Columns changed: re-read the whole sheet
+        elif not tail_rows or fit_row(tail_rows[0], len(headers)) != cached.attrs['last_row']:
+            cached = None # Rows above the watermark were inserted or deleted
+        else:
+            new_rows = tail_rows[1:]
+            if not new_rows:
+                return cached
+            df = pd.concat([cached, parse_rows(new_rows, headers)], ignore_index=True)
+            n_rows += len(new_rows)
+            last_row = fit_row(new_rows[-1], len(headers))
+
+    if cached is None:
+        # Cold start: one full read seeds the headers and the snapshot
+        rows = sh.sheet1.get_all_values()
         if len(rows) < 2:
             return pd.DataFrame()
+        headers = clean_headers(rows[0])
+        df = parse_rows(rows[1:], headers)
+        n_rows = len(rows)
+        last_row = fit_row(rows[-1], len(headers))
+        synced_at = time.time()
 
-        headers = [h.strip() for h in rows[0]]
-        df = pd.DataFrame(rows[1:], columns=headers)
-        
-        # --- FIX 1: DATE PARSING ---
-        # We use dayfirst=True because data arrives as DD/MM/YYYY (e.g. 20/12/2025)
-        # We NO LONGER add +11 hours because the UserScript sends EAT time directly.
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'], dayfirst=True, errors='coerce')
-        df['Hour'] = df['Timestamp'].dt.hour
-
-        # --- FIX 2: HANDLE MISSING COLUMNS (Backward Compatibility) ---
-        if 'Call Status' not in df.columns: df['Call Status'] = 'Answered'
-        if 'Category' not in df.columns: df['Category'] = df.get('Disposition', 'General Inquiry')
-        if 'Specific Reason' not in df.columns: df['Specific Reason'] = 'N/A'
-        
-        # --- FIX 3: THE NEW 'LEAD STATUS' FIELD ---
-        if 'Lead Status' not in df.columns: 
-            df['Lead Status'] = 'Inquiry Only' # Default for old rows
-        
-        return df
-    except Exception as e:
-        st.error(f"Connection Error: {str(e)}")
-        return pd.DataFrame()
+    # Keep rows in time order (unparsed timestamps first) so the newest calls
+    # are a tail slice; the log is appended in order, so this sort is near-linear
+    df = df.sort_values('Timestamp', kind='stable', na_position='first', ignore_index=True)
 
-# --- MAIN DASHBOARD ---
-c_head, c_status = st.columns([3, 1])
-c_head.title("🇰🇪 M-AJIRA")
+    # Re-categorize after concat (mismatched categories fall back to object)
+    for c in CATEGORY_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype('category')
+    # Remaining text as contiguous Arrow strings (the default from pandas 3)
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = df[c].astype('string[pyarrow]')
 
-# Live Clock (EAT)
-utc_now = datetime.datetime.utcnow()
-eat_now = utc_now + datetime.timedelta(hours=3)
-c_status.caption(f"Live Feed • {eat_now.strftime('%H:%M')} EAT")
+    # Success flag (Interested OR Registered) as a uint8 column, so the KPI
+    # and the leaderboard just sum it
+    df['Is Interested'] = category_mask(df['Lead Status'], INTERESTED_STATUSES).astype(np.uint8)
 
-df = load_data()
+    # Headline labels only change with the data, so they ride along in attrs
+    df.attrs = {
+        'schema': SNAPSHOT_SCHEMA,
+        'headers': headers,
+        'n_rows': n_rows,
+        'last_row': last_row,
+        'synced_at': synced_at,
+        'top_source': top_category(df['Source']),
+        'top_skill': top_category(df['Skill']),
+        'hour_hist': np.bincount(df['Hour'].dropna().astype(np.int8), minlength=24).tolist()
+    }
+    cache['df'] = df
+    try:
+        df.to_parquet(cache['path'], engine='pyarrow', compression='zstd')
+    except OSError:
+        pass # Read-only /tmp: keep serving from memory
+    return df
 
-if df.empty:
-    st.info("⏳ Waiting for data stream...")
-    time.sleep(10)
-    st.rerun()
+def category_mask(s, values):
+    # Membership test on the integer codes instead of the strings
+    codes = s.cat.categories.get_indexer(values)
+    return np.isin(s.cat.codes.to_numpy(), codes[codes >= 0])
 
-# --- KPI CALCULATION ---
-total_calls = len(df)
+def top_category(s):
+    # Most frequent label from a histogram of the category codes
+    codes = s.cat.codes.to_numpy()
+    codes = codes[codes >= 0]
+    return s.cat.categories[np.bincount(codes).argmax()] if codes.size else "N/A"
 
-# --- NEW KPI LOGIC (Based on Lead Status) ---
-# 'Interested' = Hot Lead
-# 'Registered' = Paid Activation (Satisfies Manager)
-interested_mask = df['Lead Status'].isin(['Interested', 'Registered', 'Registered (Paid Activation)'])
-interested_count = len(df[interested_mask])
+def data_signature(df):
+    # Rows are append-only, so (row count, newest timestamp) identifies the data
+    return (len(df), str(df['Timestamp'].max()))
 
-top_source = df['Source'].mode()[0] if not df.empty else "N/A"
-top_skill = df['Skill'].mode()[0] if not df.empty else "N/A"
+# Keyed on the signature only; the underscored frame is not hashed
+@st.cache_data(ttl=30, show_spinner=False)
+def compute_leaderboard(signature, _df):
+    # Calls and successes (Interested OR Registered) per agent, counted
+    # straight off the category codes (categories are the observed names)
+    agent_col = _df['Agent Name']
+    codes = agent_col.cat.codes.to_numpy()
+    known = codes >= 0
+    n_agents = len(agent_col.cat.categories)
+    interested = _df['Is Interested'].to_numpy()
+    agent_stats = pd.DataFrame({
+        'Total_Calls': np.bincount(codes[known], minlength=n_agents),
+        'Successful_Reg': np.bincount(codes[known], weights=interested[known], minlength=n_agents).astype(int)
+    }, index=pd.Index(agent_col.cat.categories, name='Agent Name'))
+    agent_stats['Conversion_Rate'] = (agent_stats['Successful_Reg'] / agent_stats['Total_Calls'] * 100).round(1)
 
-# KPI ROW
-col1, col2, col3, col4 = st.columns(4)
-col1.metric("Total Inquiries", total_calls)
-col2.metric("Interested Candidates", interested_count, delta=f"{round(interested_count/total_calls*100, 1)}%" if total_calls > 0 else "0%")
-col3.metric("Top Traffic Source", top_source)
-col4.metric("Top Requested Skill", top_skill)
+    # Descending by successes, then rate (lexsort keys are last-is-primary)
+    order = np.lexsort((-agent_stats['Conversion_Rate'].to_numpy(), -agent_stats['Successful_Reg'].to_numpy()))
+    leaderboard = agent_stats.take(order).reset_index()
+    leaderboard.insert(0, 'Rank', np.arange(1, len(leaderboard) + 1, dtype=np.int32))
+    return leaderboard
 
-st.markdown("---")
+# --- CHART BUILDERS ---
+# Builders take small, already-aggregated frames: hashing them is cheap and an
+# unchanged refresh skips Plotly's figure construction entirely.
+@st.cache_data(ttl=30, show_spinner=False)
+def build_source_quality(source_counts):
+    return px.bar(source_counts, x='Source', y='Count', color='Category', title="Source Quality (By Category)", barmode='group', template="plotly_dark", color_discrete_sequence=px.colors.qualitative.Safe)
 
-# TABS
-tab_market, tab_talent, tab_ops = st.tabs(["📻 Marketing & ROI", "🛠️ Talent & Geography", "🔒 Operations & Logs"])
+@st.cache_data(ttl=30, show_spinner=False)
+def build_lead_status(lead_counts):
+    # Color Map: Green=Interested, Orange=Paid, Blue=Inquiry, Red=Not Interested
+    color_map = {
+        'Interested': '#00cc96', 
+        'Registered': '#FFA15A', 
+        'Registered (Paid Activation)': '#FFA15A',
+        'Inquiry Only': '#636efa', 
+        'Not Interested': '#EF553B'
+    }
+    return px.pie(lead_counts, names='Status', values='Count', title="Lead Conversion (Interest Level)", hole=0.5, template="plotly_dark", color='Status', color_discrete_map=color_map)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def build_inquiry_breakdown(reason_counts):
+    # One row per Category/Reason leaf
+    breakdown_chart = px.treemap if len(reason_counts) > MAX_SUNBURST_LEAVES else px.sunburst
+    return breakdown_chart(reason_counts, path=['Category', 'Specific Reason'], values='Count', title="Inquiry Breakdown", template="plotly_dark")
+
+@st.cache_data(ttl=30, show_spinner=False)
+def build_hourly_volume(traffic_counts):
+    return px.line(traffic_counts, x='Hour', y='Calls', title="Hourly Volume", markers=True, render_mode='webgl', template="plotly_dark", color_discrete_sequence=['#3366ff'])
+
+@st.cache_data(ttl=30, show_spinner=False)
+def build_national_reach(county_counts):
+    # Slices arrive largest-first with 'Other' last; keep that order
+    fig_map = go.Figure(go.Pie(labels=county_counts['County'], values=county_counts['Count'], hole=0.4, sort=False, marker=dict(line=dict(width=0))))
+    fig_map.update_layout(title="National Reach", template="plotly_dark", legend_title_text='County', transition={'duration': 0}, hovermode='closest')
+    return fig_map
+
+@st.cache_data(ttl=30, show_spinner=False)
+def build_top_skills(top_skills):
+    fig_skill = go.Figure(go.Bar(x=top_skills['Count'], y=top_skills['Skill'], orientation='h', marker_color='#4C9AFF'))
+    fig_skill.update_layout(title="Top Skills", template="plotly_dark", xaxis_title='Count', yaxis={'title': 'Skill', 'categoryorder':'total ascending'}, transition={'duration': 0}, hovermode='closest')
+    return fig_skill
+
+# --- LIVE PANELS ---
+# Each live panel is a fragment that reruns on its own timer, so a refresh
+# only re-executes that panel: the rest of the page (including the admin
+# vault) is left alone and no script thread sleeps between ticks.
+REFRESH_SECONDS = 30
+
+def current_data(report=True):
+    # Only API/network/auth failures are reported here; anything else is a
+    # bug and should surface as one
+    try:
+        return load_data(SHEET_NAME)
+    except (GSpreadException, RequestException, GoogleAuthError) as e:
+        if report:
+            st.error(f"Connection Error: {str(e)}")
+        return pd.DataFrame()
+
+@st.fragment(run_every=10)
+def wait_for_data():
+    # The full run that placed the poller has just fetched (and reported any
+    # error), so only the timed reruns poll, and they poll quietly
+    if st.session_state.pop('skip_poll', False):
+        return
+    if not current_data(report=False).empty:
+        st.rerun(scope="app")
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_clock():
+    # Live Clock (EAT)
+    utc_now = datetime.datetime.utcnow()
+    eat_now = utc_now + datetime.timedelta(hours=3)
+    st.caption(f"Live Feed • {eat_now.strftime('%H:%M')} EAT")
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_kpis():
+    df = current_data()
+    if df.empty:
+        return
+
+    # --- KPI CALCULATION ---
+    total_calls = len(df)
+
+    # --- NEW KPI LOGIC (Based on Lead Status) ---
+    interested_count = int(df['Is Interested'].sum())
+
+    top_source = df.attrs['top_source']
+    top_skill = df.attrs['top_skill']
+
+    # KPI ROW
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Inquiries", total_calls)
+    col2.metric("Interested Candidates", interested_count, delta=f"{round(interested_count/total_calls*100, 1)}%")
+    col3.metric("Top Traffic Source", top_source)
+    col4.metric("Top Requested Skill", top_skill)
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_marketing():
+    df = current_data()
+    if df.empty:
+        return
 
-with tab_market:
     c1, c2 = st.columns(2)
     
     # 1. Source Quality
-    if not df.empty:
-        fig_roi = px.bar(df, x='Source', color='Category', title="Source Quality (By Category)", barmode='group', template="plotly_dark", color_discrete_sequence=px.colors.qualitative.Safe)
-        c1.plotly_chart(fig_roi, use_container_width=True)
+    source_counts = df.groupby(['Source', 'Category'], observed=True).size().reset_index(name='Count')
+    c1.plotly_chart(build_source_quality(source_counts), height=CHART_HEIGHT)
     
     # 2. Lead Status Breakdown (REPLACES OLD STATUS CHART)
-    if 'Lead Status' in df.columns and not df.empty:
-        lead_counts = df['Lead Status'].value_counts().reset_index()
-        lead_counts.columns = ['Status', 'Count']
-        
-        # Color Map: Green=Interested, Orange=Paid, Blue=Inquiry, Red=Not Interested
-        color_map = {
-            'Interested': '#00cc96', 
-            'Registered': '#FFA15A', 
-            'Registered (Paid Activation)': '#FFA15A',
-            'Inquiry Only': '#636efa', 
-            'Not Interested': '#EF553B'
-        }
-        
-        fig_status = px.pie(lead_counts, names='Status', values='Count', title="Lead Conversion (Interest Level)", hole=0.5, template="plotly_dark", color='Status', color_discrete_map=color_map)
-        c2.plotly_chart(fig_status, use_container_width=True)
+    lead_counts = df['Lead Status'].value_counts().reset_index()
+    lead_counts.columns = ['Status', 'Count']
+    c2.plotly_chart(build_lead_status(lead_counts), height=CHART_HEIGHT)
     
     c3, c4 = st.columns(2)
 
-    # 3. Deep Dive (Sunburst)
-    df_clean = df[df['Category'] != '']
-    if not df_clean.empty:
-        fig_sun = px.sunburst(df_clean, path=['Category', 'Specific Reason'], title="Inquiry Breakdown", template="plotly_dark")
-        c3.plotly_chart(fig_sun, use_container_width=True)
+    # 3. Deep Dive (Sunburst; treemap once there are too many leaves to lay out radially)
+    # Group first, then drop the uncategorised leaves from the small result
+    reason_counts = df.groupby(['Category', 'Specific Reason'], observed=True).size().reset_index(name='Count')
+    reason_counts = reason_counts[reason_counts['Category'].ne('')]
+    if not reason_counts.empty:
+        c3.plotly_chart(build_inquiry_breakdown(reason_counts), height=CHART_HEIGHT)
 
     # 4. Hourly Volume
-    if not df.empty:
-        traffic_counts = df['Hour'].value_counts().sort_index().reset_index()
-        traffic_counts.columns = ['Hour', 'Calls']
-        fig_time = px.line(traffic_counts, x='Hour', y='Calls', title="Hourly Volume", markers=True, template="plotly_dark", color_discrete_sequence=['#3366ff'])
-        c4.plotly_chart(fig_time, use_container_width=True)
+    traffic_counts = pd.DataFrame({'Hour': np.arange(24), 'Calls': df.attrs['hour_hist']})
+    c4.plotly_chart(build_hourly_volume(traffic_counts), height=CHART_HEIGHT)
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_talent():
+    df = current_data()
+    if df.empty:
+        return
 
-with tab_talent:
     c1, c2 = st.columns(2)
-    fig_map = px.pie(df, names='County', title="National Reach", hole=0.4, template="plotly_dark")
-    c1.plotly_chart(fig_map, use_container_width=True)
+    # Largest counties, with the long tail folded into one 'Other' slice
+    county_counts = df['County'].value_counts().reset_index()
+    county_counts.columns = ['County', 'Count']
+    if len(county_counts) > MAX_COUNTY_SLICES:
+        other = pd.DataFrame({'County': ['Other'], 'Count': [county_counts['Count'].iloc[MAX_COUNTY_SLICES:].sum()]})
+        county_counts = pd.concat([county_counts.head(MAX_COUNTY_SLICES), other], ignore_index=True)
+    c1.plotly_chart(build_national_reach(county_counts), height=CHART_HEIGHT)
     
     top_skills = df['Skill'].value_counts().head(10).reset_index()
     top_skills.columns = ['Skill', 'Count']
-    fig_skill = px.bar(top_skills, x='Count', y='Skill', orientation='h', title="Top Skills", template="plotly_dark", color='Count', color_continuous_scale='Bluyl')
-    fig_skill.update_layout(yaxis={'categoryorder':'total ascending'})
-    c2.plotly_chart(fig_skill, use_container_width=True)
+    c2.plotly_chart(build_top_skills(top_skills), height=CHART_HEIGHT)
 
-with tab_ops:
+# Nested in the (otherwise static) vault, so only the table itself ticks
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_leaderboard():
+    df = current_data()
+    if df.empty:
+        return
+
+    leaderboard = compute_leaderboard(data_signature(df), df)
+    # Rows are ordered by Successful_Reg descending, so the first is the max
+    max_reg = int(leaderboard['Successful_Reg'].iat[0]) if not leaderboard.empty else 10
+
+    st.dataframe(
+        leaderboard,
+        hide_index=True,
+        column_config={
+            "Agent Name": "Agent",
+            "Total_Calls": st.column_config.NumberColumn("Inbound Calls"),
+            "Successful_Reg": st.column_config.ProgressColumn(
+                "Interested/Reg", 
+                format="%d", 
+                min_value=0, 
+                max_value=max_reg
+            ),
+            "Conversion_Rate": st.column_config.NumberColumn("Success Rate", format="%.1f%%")
+        }
+    )
+
+# --- ADMIN VAULT ---
+# A fragment without a timer: unlocking, locking and paging rerun only the
+# vault, and nothing here runs (or loads data) until it is unlocked.
+# Lock/unlock flip the flag in on_click callbacks, which run before the
+# (fragment or full) rerun that follows the click, so no explicit st.rerun.
+def unlock_vault():
+    entered = hashlib.sha256(st.session_state.admin_password.encode()).digest()
+    st.session_state.admin_unlocked = hmac.compare_digest(entered, get_admin_digest())
+
+def lock_vault():
+    st.session_state.admin_unlocked = False
+
+@st.fragment
+def render_vault():
     st.subheader("Operational Data Vault")
-    
+
     if "admin_unlocked" not in st.session_state:
         st.session_state.admin_unlocked = False
 
     if st.session_state.admin_unlocked:
         st.success("🔓 Admin Access Granted")
-        
+    
         st.write("### 🏆 Top Performing Agents")
-        
-        agent_stats = df.groupby('Agent Name').agg(
-            Total_Calls=('Timestamp', 'count')
-        )
-        
-        # Calculate Success based on Lead Status (Interested OR Registered)
-        success_counts = df[interested_mask].groupby('Agent Name').size()
-        agent_stats['Successful_Reg'] = success_counts
-        agent_stats['Successful_Reg'] = agent_stats['Successful_Reg'].fillna(0).astype(int)
-        agent_stats['Conversion_Rate'] = (agent_stats['Successful_Reg'] / agent_stats['Total_Calls'] * 100).round(1)
-        
-        leaderboard = agent_stats.sort_values(by=['Successful_Reg', 'Conversion_Rate'], ascending=False).reset_index()
-        leaderboard.index += 1
-        
-        st.dataframe(
-            leaderboard,
-            use_container_width=True,
-            column_config={
-                "Agent Name": "Agent",
-                "Total_Calls": st.column_config.NumberColumn("Inbound Calls"),
-                "Successful_Reg": st.column_config.ProgressColumn(
-                    "Interested/Reg", 
-                    format="%d", 
-                    min_value=0, 
-                    max_value=int(leaderboard['Successful_Reg'].max()) if not leaderboard.empty else 10
-                ),
-                "Conversion_Rate": st.column_config.NumberColumn("Success Rate", format="%.1f%%")
-            }
-        )
-        
+    
+        render_leaderboard()
+    
         st.write("### 📂 Raw Call Logs")
         with st.expander("Expand to view Excel Data", expanded=True):
-            # Sort by Timestamp descending so newest calls are first
-            st.dataframe(df.sort_values('Timestamp', ascending=False), use_container_width=True)
-            
-        if st.button("🔒 Lock Data"):
-            st.session_state.admin_unlocked = False
-            st.rerun()
-            
+            # Newest calls first; only the latest N rows are sent to the browser
+            n_logs = st.number_input("Rows", min_value=100, max_value=10000, value=500, step=100)
+            df = current_data()
+            if not df.empty:
+                # Is Interested is an internal flag, not a sheet column
+                st.dataframe(df.tail(n_logs).iloc[::-1].drop(columns='Is Interested'), hide_index=True)
+        
+        st.button("🔒 Lock Data", on_click=lock_vault)
+        
     else:
         st.warning("⚠️ Restricted Access")
-        password_input = st.text_input("Enter Admin Password", type="password")
-        if st.button("Unlock Logs"):
-            if password_input == ADMIN_PASSWORD:
-                st.session_state.admin_unlocked = True
-                st.rerun()
-            else:
-                st.error("❌ Incorrect Password")
-
-time.sleep(30) # Auto-refresh every 30s
-st.rerun()
+        st.text_input("Enter Admin Password", type="password", key="admin_password")
+        # A correct password already switched to the unlocked branch above,
+        # so a click that lands here was a wrong one
+        if st.button("Unlock Logs", on_click=unlock_vault):
+            st.error("❌ Incorrect Password")
+
+# --- MAIN DASHBOARD ---
+c_head, c_status = st.columns([3, 1])
+c_head.title("🇰🇪 M-AJIRA")
+with c_status:
+    render_clock()
+
+df = current_data()
+
+if df.empty:
+    st.info("⏳ Waiting for data stream...")
+    st.session_state.skip_poll = True
+    wait_for_data()
+    st.stop()
+
+render_kpis()
+
+st.markdown("---")
+
+# TABS
+tab_market, tab_talent, tab_ops = st.tabs(["📻 Marketing & ROI", "🛠️ Talent & Geography", "🔒 Operations & Logs"])
+
+with tab_market:
+    render_marketing()
+
+with tab_talent:
+    render_talent()
+
+with tab_ops:
+    render_vault()